@@ -1,6 +1,8 @@
 import json
 import os
 from argparse import ArgumentParser, Namespace
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import musdb
 import museval
@@ -8,6 +10,7 @@ import museval
 import torch
 from tqdm import tqdm
 
+from src.dataset import MUSDBTrackDataset
 from src.preprocess import preprocess
 from src.separator import load_separator
 from src.utils import get_device
@@ -66,9 +69,29 @@ def parse_arguments() -> Namespace:
         'a list of targets that are used to build it. For instance: '
         "\'{'vocals':['vocals'], 'accompaniment':['drums', 'bass', 'other']}\'",
     )
+    parser.add_argument(
+        '--fp32',
+        action='store_true',
+        help='disable bf16 autocast for the spectrogram models',
+    )
+    parser.add_argument(
+        '--compile',
+        action='store_true',
+        help='compile the STFT and target models with torch.compile',
+    )
     return parser.parse_args()
 
 
+def estimates_to_numpy(estimates: dict) -> dict:
+    """Copy the first sample of every estimate to the host with a single
+    transfer, returned as (nb_timesteps, nb_channels) views into pageable
+    memory that can safely outlive the track"""
+    keys = list(estimates)
+    stacked = torch.stack([estimates[key][0].detach() for key in keys], dim=0)
+    stacked = stacked.cpu().numpy()
+    return {key: stacked[i].T for i, key in enumerate(keys)}
+
+
 if __name__ == '__main__':
     args = parse_arguments()
 
@@ -91,32 +114,64 @@ if __name__ == '__main__':
         device=device,
     )
 
-    for track in tqdm(mus.tracks):
-        audio = torch.as_tensor(track.audio, dtype=torch.float32, device=device)
-        audio = preprocess(audio, track.rate, separator.sample_rate)
-
-        # Task 1
-        match args.task:
-            case 1:
-                estimates = separator(audio)
-                estimates = separator.to_dict(estimates, aggregate_dict=aggregate_dict)
-
-                for key in estimates:
-                    estimates[key] = estimates[key][0].cpu().detach().numpy().T
-
-                mus.save_estimates(estimates, track, os.path.join(args.checkpoint_path, 'results'))
-            case 2:
-                estimates = separator.seperate(audio)
-                # sf.write(f'separated_sample_vocal.wav', vocal_audio, separator.sample_rate)
-                # sf.write(f'separated_sample_nonvocal.wav', nonvocal_audio, separator.sample_rate)
-
-        scores = museval.eval_mus_track(
-            track,
-            estimates,
-            output_dir=os.path.join(args.checkpoint_path, 'results'),
-        )
-        results.add_track(scores)
-        print(track, '\n', scores)
+    if args.compile:
+        # track lengths differ, so compile with dynamic shapes instead of recompiling
+        # for every new number of frames. cuda graphs would still be recorded once per
+        # shape and never replayed, so they are left out.
+        separator.stft = torch.compile(separator.stft, dynamic=True)
+        for name, model in list(separator.target_models.items()):
+            separator.target_models[name] = torch.compile(
+                model,
+                mode='max-autotune-no-cudagraphs',
+                dynamic=True,
+            )
+
+    eval_workers = 4
+    eval_futures = deque()
+    with ThreadPoolExecutor(max_workers=eval_workers) as eval_pool:
+        track_loader = MUSDBTrackDataset(mus).get_loader(pin_memory=device.type == 'cuda')
+        for index, rate, audio in tqdm(track_loader):
+            track = mus.tracks[index]
+            audio = audio.to(device, non_blocking=True)
+            audio = preprocess(audio, rate, separator.sample_rate)
+
+            # Task 1
+            match args.task:
+                case 1:
+                    with torch.inference_mode(), torch.autocast(
+                        dtype=torch.bfloat16,
+                        device_type=device.type,
+                        enabled=device.type == 'cuda' and not args.fp32,
+                    ):
+                        estimates = separator(audio)
+                    estimates = separator.to_dict(estimates, aggregate_dict=aggregate_dict)
+                    estimates = estimates_to_numpy(estimates)
+
+                    mus.save_estimates(estimates, track, os.path.join(args.checkpoint_path, 'results'))
+                case 2:
+                    estimates = separator.seperate(audio)
+                    # sf.write(f'separated_sample_vocal.wav', vocal_audio, separator.sample_rate)
+                    # sf.write(f'separated_sample_nonvocal.wav', nonvocal_audio, separator.sample_rate)
+
+            # score on the cpu while the next track is separated, but bound the
+            # number of tracks in flight so their estimates do not pile up in memory
+            if len(eval_futures) >= eval_workers:
+                done_track, future = eval_futures.popleft()
+                scores = future.result()
+                results.add_track(scores)
+                print(done_track, '\n', scores)
+
+            eval_futures.append((track, eval_pool.submit(
+                museval.eval_mus_track,
+                track,
+                estimates,
+                output_dir=os.path.join(args.checkpoint_path, 'results'),
+            )))
+
+        for track, future in eval_futures:
+            scores = future.result()
+            results.add_track(scores)
+            print(track, '\n', scores)
 
     print(results)
     method = museval.MethodStore()
@@ -185,6 +185,33 @@ class MUSDBDataset(Dataset):
         }
 
 
+class MUSDBTrackDataset(Dataset):
+    """Full MUSDB tracks for inference, decoded in DataLoader workers.
+    Yields (index, rate, audio) where audio is of shape (nb_timesteps, nb_channels)
+    """
+
+    def __init__(self, mus: musdb.DB) -> None:
+        self.mus = mus
+
+    def __len__(self) -> int:
+        return len(self.mus.tracks)
+
+    def __getitem__(self, index):
+        track = self.mus.tracks[index]
+        return index, track.rate, torch.as_tensor(track.audio, dtype=torch.float32)
+
+    def get_loader(self, num_workers=2, prefetch_factor=2, pin_memory=True):
+        # batch_size=None yields the tracks one by one without collating
+        return DataLoader(
+            self,
+            batch_size=None,
+            shuffle=False,
+            num_workers=num_workers,
+            prefetch_factor=prefetch_factor,
+            pin_memory=pin_memory,
+        )
+
+
 class Compose(object):
     """Composes several augmentation transforms.
     Args:
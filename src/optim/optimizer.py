@@ -23,8 +23,14 @@ def get_optimizer(
         case _:
             raise ValueError(f'Optimizer {name} not found')
 
+    # fused kernels need the parameters to be on cuda already
+    kwargs = {}
+    if optimizer in (Adam, AdamW) and next(model.parameters()).is_cuda:
+        kwargs['fused'] = True
+
     return optimizer(
         model.parameters(),
         lr=lr,
-        weight_decay=weight_decay
+        weight_decay=weight_decay,
+        **kwargs,
     )
@@ -67,7 +67,7 @@ class Separator(nn.Module):
             n_hop=n_hop,
             center=True,
         )
-        self.complexnorm = ComplexNorm(mono=nb_channels == 1)
+        self.complexnorm = ComplexNorm(mono=nb_channels == 1, complex_input=True)
 
         # registering the targets models
         self.target_models = nn.ModuleDict(target_models)
@@ -100,7 +100,7 @@ class Separator(nn.Module):
         nb_samples = audio.shape[0]
 
         # getting the STFT of mix:
-        # (nb_samples, nb_channels, nb_bins, nb_frames, 2)
+        # (nb_samples, nb_channels, nb_bins, nb_frames)
         mix_stft = self.stft(audio)
         X = self.complexnorm(mix_stft)
 
@@ -119,7 +119,7 @@ class Separator(nn.Module):
         # rearranging it into:
         # (nb_samples, nb_frames, nb_bins, nb_channels, 2) to feed
         # into filtering methods
-        mix_stft = mix_stft.permute(0, 3, 2, 1, 4)
+        mix_stft = torch.view_as_real(mix_stft).permute(0, 3, 2, 1, 4)
 
         # create an additional target if we need to build a residual
         if self.residual:
@@ -135,26 +135,29 @@ class Separator(nn.Module):
 
         nb_frames = spectrograms.shape[1]
         targets_stft = torch.zeros(mix_stft.shape + (nb_sources,), dtype=audio.dtype, device=mix_stft.device)
-        for sample in range(nb_samples):
-            pos = 0
-            if self.wiener_win_len:
-                wiener_win_len = self.wiener_win_len
-            else:
-                wiener_win_len = nb_frames
-            while pos < nb_frames:
-                cur_frame = torch.arange(pos, min(nb_frames, pos + wiener_win_len))
-                pos = int(cur_frame[-1]) + 1
-
-                targets_stft[sample, cur_frame] = wiener(
-                    spectrograms[sample, cur_frame],
-                    mix_stft[sample, cur_frame],
-                    self.niter,
-                    softmask=self.softmask,
-                    residual=self.residual,
-                )
 
-        # getting to (nb_samples, nb_targets, channel, fft_size, n_frames, 2)
-        targets_stft = targets_stft.permute(0, 5, 3, 2, 1, 4).contiguous()
+        # wiener filtering needs the fp32 dynamic range, keep it out of autocast
+        with torch.autocast(device_type=mix_stft.device.type, enabled=False):
+            for sample in range(nb_samples):
+                pos = 0
+                if self.wiener_win_len:
+                    wiener_win_len = self.wiener_win_len
+                else:
+                    wiener_win_len = nb_frames
+                while pos < nb_frames:
+                    cur_frame = torch.arange(pos, min(nb_frames, pos + wiener_win_len))
+                    pos = int(cur_frame[-1]) + 1
+
+                    targets_stft[sample, cur_frame] = wiener(
+                        spectrograms[sample, cur_frame],
+                        mix_stft[sample, cur_frame],
+                        self.niter,
+                        softmask=self.softmask,
+                        residual=self.residual,
+                    )
+
+        # getting to complex (nb_samples, nb_targets, channel, fft_size, n_frames)
+        targets_stft = torch.view_as_complex(targets_stft.permute(0, 5, 3, 2, 1, 4).contiguous())
 
         # inverse STFT
         estimates = self.istft(targets_stft, length=audio.shape[2])
@@ -193,7 +196,7 @@ class Separator(nn.Module):
         nb_sources = self.nb_targets
 
         # getting the STFT of mix:
-        # (nb_samples, nb_channels, nb_bins, nb_frames, 2)
+        # (nb_samples, nb_channels, nb_bins, nb_frames)
         mix_stft = self.stft(audio)
         X = self.complexnorm(mix_stft)
 
@@ -265,7 +268,12 @@ def load_separator(
     freeze=True,
 ) -> Separator:
 
-    checkpoint = torch.load(os.path.join(checkpoint_path, CKPT_FILE), weights_only=True)['model']
+    checkpoint = torch.load(
+        os.path.join(checkpoint_path, CKPT_FILE),
+        map_location='cpu',
+        mmap=True,
+        weights_only=True,
+    )['model']
     config = load_config(os.path.join(checkpoint_path, CONFIG_FILE))
     model = get_model(
         name=config.model_type,
@@ -277,7 +285,7 @@ def load_separator(
         max_bin=config.max_bin,
         unidirectional=config.unidirectional,
     )
-    model.load_state_dict(checkpoint)
+    model.load_state_dict(checkpoint, assign=True)
     model.to(device)
 
     separator = Separator(
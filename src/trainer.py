@@ -27,6 +27,7 @@ class Trainer:
         fp32: bool = False,
         disable_valid_on_start: bool = False,
         checkpoint_dir: str = None,
+        log_every: int = 50,
     ) -> None:
 
         self.encoder = encoder
@@ -46,6 +47,7 @@ class Trainer:
         self.cur_ep = 0
         self.checkpoint_dir = checkpoint_dir
         self.best_loss = float('inf')
+        self.log_every = log_every
         print(self)
 
     def __repr__(self) -> str:
@@ -64,13 +66,21 @@ class Trainer:
         ).replace('\n', f'\n{tab}').replace(f'\n{tab}P', f'\n{tab}{tab}P') + '\n)'
 
     def _shared_step(self, batch_data) -> Dict[str, torch.Tensor]:
-        x = self.encoder(batch_data['audio'])
-        y = self.encoder(batch_data['target'])
+        # encode mixture and target with a single batched STFT
+        x, y = self.encoder(
+            torch.cat([batch_data['audio'], batch_data['target']], dim=0)
+        ).chunk(2, dim=0)
         outputs = self.model(x)
         loss = self.criterion(outputs, y)
         return {
             'loss': loss,
             'lr': self.lr_scheduler.get_last_lr()[0],
+        }
+
+    def _vram_stats(self) -> Dict[str, float]:
+        if self.device.type != 'cuda':
+            return {}
+        return {
             'vram_allocated_MB': torch.cuda.memory_allocated() / (1024 ** 2),
             'vram_reserved_MB': torch.cuda.memory_reserved() / (1024 ** 2),
         }
@@ -85,6 +95,8 @@ class Trainer:
         progress_bar = tqdm(self.train_loader, desc=f'Training {self.cur_ep}')
         self.model.train()
 
+        # keep outputs on device and sync with the host once every `log_every` steps
+        pending_outputs = []
         for step, batch_data in enumerate(progress_bar, start=1):
             batch_data = dict_to_device(batch_data, self.device)
 
@@ -100,30 +112,38 @@ class Trainer:
             self.grad_scaler.scale(output['loss'] / self.accum_grad_step).backward()
 
             if step % self.accum_grad_step == 0:
-                self.grad_scaler.unscale_(self.optimizer)
-
                 if self.clip_grad_norm is not None:
-                    nn.utils.clip_grad_norm_(self.model.parameters(), self.clip_grad_norm)
+                    # grad_scaler.step unscales by itself when there is nothing to clip
+                    self.grad_scaler.unscale_(self.optimizer)
+                    nn.utils.clip_grad_norm_(self.model.parameters(), self.clip_grad_norm, foreach=True)
 
                 self.grad_scaler.step(optimizer=self.optimizer)
                 self.grad_scaler.update()
-                self.optimizer.zero_grad()
+                self.optimizer.zero_grad(set_to_none=True)
                 self.lr_scheduler.step()
 
-            record = {
-                f'train_{k}': v.item() if isinstance(v, torch.Tensor) else v
-                for k, v in output.items()
-            }
-            progress_bar.set_postfix(record)
-            self.log(record)
+            pending_outputs.append(output | {'loss': output['loss'].detach()})
+            if step % self.log_every == 0 or step == len(self.train_loader):
+                losses = torch.stack([o['loss'] for o in pending_outputs]).tolist()
+                records = [
+                    {f'train_{k}': v for k, v in (o | {'loss': loss}).items()}
+                    for o, loss in zip(pending_outputs, losses)
+                ]
+                records[-1] |= {f'train_{k}': v for k, v in self._vram_stats().items()}
+                for record in records:
+                    self.log(record)
+                progress_bar.set_postfix(records[-1])
+                pending_outputs.clear()
         progress_bar.close()
 
-    @torch.no_grad()
+    @torch.inference_mode()
     def valid_one_epoch(self)-> None:
         progress_bar = tqdm(self.valid_loader, desc=f'Validation {self.cur_ep}')
         self.model.eval()
 
-        outputs = []
+        # accumulate on device to sync with the host only once
+        loss_sum = torch.zeros((), device=self.device)
+        num_steps = 0
         for _, batch_data in enumerate(progress_bar, start=1):
             batch_data = dict_to_device(batch_data, self.device)
             with torch.amp.autocast(
@@ -133,18 +153,22 @@ class Trainer:
             ):
                 output = self.valid_step(batch_data)
                 del batch_data
-            outputs.append(output)
+            loss_sum += output['loss'].detach().float()
+            num_steps += 1
 
         progress_bar.close()
-        loss = torch.tensor([o['loss'] for o in outputs]).mean().item()
+        loss = (loss_sum / num_steps).item()
         record = {'valid_loss': round(loss, 4)}
         self.log({'epoch': self.cur_ep} | record | {'best_loss': self.best_loss})
         print(record)
 
-        self.save(os.path.join(self.checkpoint_dir, f'epoch={self.cur_ep}-loss={loss:.4f}.pth'))
+        self.save(
+            os.path.join(self.checkpoint_dir, f'epoch={self.cur_ep}-loss={loss:.4f}.pth'),
+            include_optimizer=False,
+        )
         if record['valid_loss'] < self.best_loss:
             self.best_loss = record['valid_loss']
-            self.save(os.path.join(self.checkpoint_dir, CKPT_FILE))
+            self.save(os.path.join(self.checkpoint_dir, CKPT_FILE), include_optimizer=True)
             print(f'Save best model: epoch={self.cur_ep}, loss={self.best_loss}')
 
     def log(self, record: Dict[str, float]) -> None:
@@ -152,6 +176,12 @@ class Trainer:
             self.logger.log(record)
 
     def fit(self, epochs: int) -> None:
+        # overrides cudnn.benchmark = False from set_random_seeds, trading run-to-run
+        # reproducibility for autotuned conv kernels. Training crops share one shape,
+        # full-length validation tracks are autotuned once per length. Recurrent
+        # models such as the default openunmix LSTM are not affected.
+        torch.backends.cudnn.benchmark = True
+
         self.encoder.to(self.device)
         self.model.to(self.device)
         if not self.disable_valid_on_start:
@@ -160,17 +190,29 @@ class Trainer:
             self.train_one_epoch()
             self.valid_one_epoch()
 
-    def save(self, path) -> None:
+    def save(self, path, include_optimizer: bool = True) -> None:
         checkpoint = {
             'epoch': self.cur_ep,
             'model': self.model.state_dict(),
-            'optimizer': self.optimizer.state_dict(),
-            'lr_scheduler': self.lr_scheduler.state_dict(),
         }
-        torch.save(checkpoint, path)
+        if include_optimizer:
+            checkpoint |= {
+                'optimizer': self.optimizer.state_dict(),
+                'lr_scheduler': self.lr_scheduler.state_dict(),
+            }
+        # write to a temporary file first so an interrupted save never leaves a partial checkpoint
+        torch.save(checkpoint, f'{path}.tmp')
+        os.replace(f'{path}.tmp', path)
 
     def load(self, path):
-        checkpoint = torch.load(os.path.join(path, CKPT_FILE))
-        self.model.load_state_dict(checkpoint['model'], weights_only=True)
+        # mmap streams tensors from disk instead of reading the whole file up front
+        checkpoint = torch.load(
+            os.path.join(path, CKPT_FILE),
+            map_location='cpu',
+            mmap=True,
+            weights_only=True,
+        )
+        # no assign=True here, the optimizer holds references to the current parameters
+        self.model.load_state_dict(checkpoint['model'])
         self.optimizer.load_state_dict(checkpoint['optimizer'])
         self.lr_scheduler.load_state_dict(checkpoint['lr_scheduler'])
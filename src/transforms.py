@@ -1,25 +1,35 @@
+import functools
 from typing import Optional, Tuple
 
 import torch
+import torch.nn.functional as F
 from torch import nn
 
 
+@functools.lru_cache(maxsize=16)
+def _get_hann(
+    n_fft: int,
+    device: Optional[torch.device] = None,
+    dtype: Optional[torch.dtype] = None,
+) -> torch.Tensor:
+    # shared across STFT/ISTFT instances, must never be modified in-place
+    return torch.hann_window(n_fft, device=device, dtype=dtype)
+
+
 def make_filterbanks(
     n_fft: int = 4096,
     n_hop: int = 1024,
     center: bool = False,
 ) -> Tuple[nn.Module, nn.Module]:
 
-    window = nn.Parameter(torch.hann_window(n_fft), requires_grad=False)
-
-    encoder = TorchSTFT(n_fft=n_fft, n_hop=n_hop, window=window, center=center)
-    decoder = TorchISTFT(n_fft=n_fft, n_hop=n_hop, window=window, center=center)
+    encoder = TorchSTFT(n_fft=n_fft, n_hop=n_hop, center=center)
+    decoder = TorchISTFT(n_fft=n_fft, n_hop=n_hop, center=center)
     return encoder, decoder
 
 
 class TorchSTFT(nn.Module):
     """Multichannel Short-Time-Fourier Forward transform
-    uses hard coded hann_window.
+    uses a hann_window shared by all instances on the same device by default.
     Args:
         n_fft (int, optional): transform FFT size. Defaults to 4096.
         n_hop (int, optional): transform hop size. Defaults to 1024.
@@ -28,7 +38,9 @@ class TorchSTFT(nn.Module):
             reconstruction of the signal. However, during training
             of spectrogram models, it can safely turned off.
             Defaults to `true`
-        window (nn.Parameter, optional): window function
+        window (Tensor, optional): window function, kept as a non-persistent
+            buffer. Defaults to the cached hann window for the input's
+            device and dtype
     """
 
     def __init__(
@@ -36,27 +48,30 @@ class TorchSTFT(nn.Module):
         n_fft: int = 4096,
         n_hop: int = 1024,
         center: bool = False,
-        window: Optional[nn.Parameter] = None,
+        window: Optional[torch.Tensor] = None,
     ):
         super(TorchSTFT, self).__init__()
-        if window is None:
-            self.window = nn.Parameter(torch.hann_window(n_fft), requires_grad=False)
-        else:
-            self.window = window
+        # only a custom window is kept as a buffer, the default hann window is looked
+        # up per (n_fft, device, dtype) in forward so it stays shared after .to(device)
+        self.register_buffer('window', window, persistent=False)
 
         self.n_fft = n_fft
         self.n_hop = n_hop
         self.center = center
 
-    def forward(self, x: torch.Tensor) -> torch.Tensor:
+    def forward(self, x: torch.Tensor, return_complex: bool = True) -> torch.Tensor:
         """STFT forward path
         Args:
             x (Tensor): audio waveform of
                 shape (nb_samples, nb_channels, nb_timesteps)
+            return_complex (bool, optional): If True, return a complex
+                tensor, otherwise stack real and imaginary on the last axis.
+                Defaults to `True`
         Returns:
             STFT (Tensor): complex stft of
+                shape (nb_samples, nb_channels, nb_bins, nb_frames) or
                 shape (nb_samples, nb_channels, nb_bins, nb_frames, complex=2)
-                last axis is stacked real and imaginary
+                if `return_complex` is False
         """
 
         shape = x.size() # (nb_samples, nb_channels, nb_timesteps)
@@ -64,17 +79,30 @@ class TorchSTFT(nn.Module):
         # pack batch
         x = x.view(-1, shape[-1])
 
+        if self.center:
+            # reflect-pad the whole batch once, equivalent to
+            # torch.stft(center=True, pad_mode="reflect")
+            x = F.pad(x, (self.n_fft // 2, self.n_fft // 2), mode="reflect")
+
+        if self.window is None:
+            window = _get_hann(self.n_fft, x.device, x.dtype)
+        else:
+            window = self.window
+
         complex_stft = torch.stft(
             x,
             n_fft=self.n_fft,
             hop_length=self.n_hop,
-            window=self.window,
-            center=self.center,
+            window=window,
+            center=False,
             normalized=False,
             onesided=True,
-            pad_mode="reflect",
             return_complex=True,
         )
+        if return_complex:
+            # unpack batch
+            return complex_stft.view(shape[:-1] + complex_stft.shape[-2:])
+
         stft_f = torch.view_as_real(complex_stft)
         # unpack batch
         stft_f = stft_f.view(shape[:-1] + stft_f.shape[-3:])
@@ -86,11 +114,14 @@ class TorchISTFT(nn.Module):
     wrapper for torch.istft to support batches
     Args:
         STFT (Tensor): complex stft of
+            shape (nb_samples, nb_channels, nb_bins, nb_frames) or
             shape (nb_samples, nb_channels, nb_bins, nb_frames, complex=2)
-            last axis is stacked real and imaginary
+            with stacked real and imaginary on the last axis
         n_fft (int, optional): transform FFT size. Defaults to 4096.
         n_hop (int, optional): transform hop size. Defaults to 1024.
-        window (callable, optional): window function
+        window (Tensor, optional): window function, kept as a non-persistent
+            buffer. Defaults to the cached hann window for the input's
+            device and dtype
         center (bool, optional): If True, the signals first window is
             zero padded. Centering is required for a perfect
             reconstruction of the signal. However, during training
@@ -108,7 +139,7 @@ class TorchISTFT(nn.Module):
         n_hop: int = 1024,
         center: bool = False,
         sample_rate: float = 44100.0,
-        window: Optional[nn.Parameter] = None,
+        window: Optional[torch.Tensor] = None,
     ) -> None:
         super(TorchISTFT, self).__init__()
 
@@ -117,27 +148,36 @@ class TorchISTFT(nn.Module):
         self.center = center
         self.sample_rate = sample_rate
 
-        if window is None:
-            self.window = nn.Parameter(torch.hann_window(n_fft), requires_grad=False)
-        else:
-            self.window = window
+        # only a custom window is kept as a buffer, the default hann window is looked
+        # up per (n_fft, device, dtype) in forward so it stays shared after .to(device)
+        self.register_buffer('window', window, persistent=False)
 
     def forward(self, X: torch.Tensor, length: Optional[int] = None) -> torch.Tensor:
         shape = X.size()
-        X = X.reshape(-1, shape[-3], shape[-2], shape[-1])
+        if X.is_complex():
+            batch_shape = shape[:-2]
+            X = X.reshape(-1, shape[-2], shape[-1])
+        else:
+            batch_shape = shape[:-3]
+            X = torch.view_as_complex(X.reshape(-1, shape[-3], shape[-2], shape[-1]))
+
+        if self.window is None:
+            window = _get_hann(self.n_fft, X.device, X.real.dtype)
+        else:
+            window = self.window
 
         y = torch.istft(
-            torch.view_as_complex(X),
+            X,
             n_fft=self.n_fft,
             hop_length=self.n_hop,
-            window=self.window,
+            window=window,
             center=self.center,
             normalized=False,
             onesided=True,
             length=length,
         )
 
-        y = y.reshape(shape[:-3] + y.shape[-1:])
+        y = y.reshape(batch_shape + y.shape[-1:])
 
         return y
 
@@ -150,25 +190,30 @@ class ComplexNorm(nn.Module):
     Args:
         mono (bool): Downmix to single channel after applying power norm
             to maximize
+        complex_input (bool): Expect a complex tensor instead of stacked
+            real and imaginary parts on the last axis
     """
 
-    def __init__(self, mono: bool = False):
+    def __init__(self, mono: bool = False, complex_input: bool = False):
         super(ComplexNorm, self).__init__()
         self.mono = mono
+        self.complex_input = complex_input
 
     def forward(self, spec: torch.Tensor) -> torch.Tensor:
         """
         Args:
             spec: complex_tensor (Tensor): Tensor shape of
-                `(..., complex=2)`
+                `(...,)` if `complex_input` else `(..., complex=2)`
 
         Returns:
             Tensor: Power/Mag of input
                 `(...,)`
         """
         # take the magnitude
-
-        spec = torch.abs(torch.view_as_complex(spec))
+        if self.complex_input:
+            spec = spec.abs()
+        else:
+            spec = torch.abs(torch.view_as_complex(spec))
 
         # downmix in the mag domain to preserve energy
         if self.mono:
@@ -181,8 +226,9 @@ class AudioEncoder(nn.Module):
     def __init__(self, n_fft, n_hop, sample_rate, num_channels):
         super(AudioEncoder, self).__init__()
         self.stft = TorchSTFT(n_fft=n_fft, n_hop=n_hop)
-        self.complex_norm = ComplexNorm(mono=num_channels == 1)
+        self.complex_norm = ComplexNorm(mono=num_channels == 1, complex_input=True)
 
+    # not inference_mode: the outputs are saved for backward by the training loss
     @torch.no_grad()
     def forward(self, x):
         return self.complex_norm(self.stft(x))
@@ -220,7 +220,7 @@ if __name__ == '__main__':
         hidden_size=args.hidden_size,
         max_bin=max_bin,
         unidirectional=args.unidirectional,
-    )
+    ).to(device)
     criterion = get_loss(name=args.loss)
     optimizer = get_optimizer(
         name=args.optimizer,